@@ -0,0 +1,109 @@
+import os
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from src.models.note import Note
+
+try:
+    import redis
+except ImportError:  # caching is optional
+    redis = None
+
+# The cached notes list is stored under a key that includes a generation
+# number, and every committed change to notes bumps the generation. A reader
+# that queried before the change can only store its snapshot under the old
+# generation, which nobody reads any more.
+NOTES_GENERATION_KEY = 'notes:list:gen'
+NOTES_LIST_KEY = 'notes:list:v1:{}'
+NOTES_LIST_TTL = 60  # seconds
+# Payloads larger than this aren't cached, so streaming stays bounded.
+NOTES_LIST_MAX_BYTES = 4 * 1024 * 1024
+
+_client = None
+
+
+def get_client():
+    """Return the shared Redis client, or None when caching is disabled.
+
+    Caching is enabled by setting REDIS_URL and installing `redis`.
+    """
+    global _client
+    if _client is None and redis is not None and os.getenv('REDIS_URL'):
+        # short timeouts so an unreachable host degrades to "no cache"
+        # instead of stalling every request on the OS connect timeout
+        _client = redis.Redis.from_url(os.getenv('REDIS_URL'),
+                                       socket_connect_timeout=0.2,
+                                       socket_timeout=0.2)
+    return _client
+
+
+def fetch(key):
+    """Cached bytes for `key`, or None on a miss or if Redis is unreachable."""
+    client = get_client()
+    if client is None:
+        return None
+    try:
+        return client.get(key)
+    except redis.RedisError:
+        return None
+
+
+def store(key, value, ttl):
+    client = get_client()
+    if client is None:
+        return
+    try:
+        client.setex(key, ttl, value)
+    except redis.RedisError:
+        pass
+
+
+def notes_list_key():
+    """Cache key for the notes list at the current generation.
+
+    Returns None when caching is disabled or Redis is unreachable. Read it
+    before querying, so a write committed mid-query changes the key.
+    """
+    client = get_client()
+    if client is None:
+        return None
+    try:
+        generation = client.get(NOTES_GENERATION_KEY)
+    except redis.RedisError:
+        return None
+    return NOTES_LIST_KEY.format(int(generation or 0))
+
+
+def _bump_notes_generation():
+    client = get_client()
+    if client is None:
+        return
+    try:
+        client.incr(NOTES_GENERATION_KEY)
+    except redis.RedisError:
+        pass
+
+
+# Bump the notes-list generation only once a change to notes is committed,
+# so a reader can't repopulate the cache from data that is later rolled back.
+
+def mark_notes_changed(session):
+    """Flag a session whose notes changed outside a flush (e.g. bulk INSERT)."""
+    session.info['notes_changed'] = True
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_note_changes(session, flush_context):
+    if any(isinstance(obj, Note) for obj in (*session.new, *session.dirty, *session.deleted)):
+        mark_notes_changed(session)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_notes_list(session):
+    if session.info.pop('notes_changed', False):
+        _bump_notes_generation()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_note_changes(session):
+    session.info.pop('notes_changed', None)
@@ -0,0 +1,18 @@
+import orjson
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+
+
+class ORJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson.
+
+    orjson serializes datetimes natively, so models can hand raw datetime
+    values to jsonify. Anything orjson doesn't know falls back to Flask's
+    default conversions (Decimal, date, UUID, ...).
+    """
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=DefaultJSONProvider.default,
+                            option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
@@ -8,12 +8,14 @@ from flask_cors import CORS
 from src.models.user import db
 from src.routes.user import user_bp
 from src.routes.note import note_bp
-from src.models.note import Note
+from src.models.note import Note, upgrade_schema
+from src.json_provider import ORJSONProvider
 from dotenv import load_dotenv#新增
 
 load_dotenv()#新增
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+app.json = ORJSONProvider(app)
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("DATABASE_URL")
 
@@ -34,6 +36,7 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 with app.app_context():
     db.create_all()
+    upgrade_schema()
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -1,30 +1,272 @@
+import threading
+from collections import OrderedDict
 from datetime import datetime
+
+import orjson
+from flask import current_app
+from sqlalchemy import func, inspect, literal_column, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
 from src.models import db
 
 
+note_tags = db.Table(
+    'note_tags',
+    db.Column('note_id', db.Integer, db.ForeignKey('notes.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True),
+    # the primary key covers note -> tags; tag filtering walks tag -> notes
+    db.Index('ix_note_tags_tag_id', 'tag_id', 'note_id'),
+)
+
+
+class Tag(db.Model):
+    """A tag name shared by any number of notes."""
+    __tablename__ = 'tags'
+
+    id = db.Column(db.Integer, primary_key=True)
+    # as wide as the legacy notes.tags column, so any tag stored there fits
+    name = db.Column(db.String(255), unique=True, nullable=False)
+
+    __table_args__ = (
+        # tag filtering is case-insensitive
+        db.Index('ix_tags_name_lower', func.lower(name)),
+    )
+
+    def __repr__(self):
+        return f"<Tag id={self.id} name={self.name!r}>"
+
+
+def insert_missing_tags(names):
+    """Make sure a `tags` row exists for each of `names`.
+
+    Uses INSERT ... ON CONFLICT DO NOTHING where the dialect supports it, so
+    concurrent writers creating the same tag don't collide.
+    """
+    names = list(names)
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        stmt = postgresql.insert(Tag).on_conflict_do_nothing(index_elements=['name'])
+    elif dialect == 'sqlite':
+        stmt = sqlite.insert(Tag).on_conflict_do_nothing(index_elements=['name'])
+    else:
+        existing = set(db.session.scalars(select(Tag.name).where(Tag.name.in_(names))))
+        names = [n for n in names if n not in existing]
+        stmt = Tag.__table__.insert()
+    if names:
+        db.session.execute(stmt, [{'name': n} for n in names])
+
+
+def link_tags(names_by_note):
+    """Attach tags to notes inserted without going through the ORM.
+
+    `names_by_note` maps note id -> list of (deduplicated) tag names.
+    """
+    all_names = {n for names in names_by_note.values() for n in names}
+    if not all_names:
+        return
+    insert_missing_tags(all_names)
+    tag_ids = dict(db.session.execute(
+        select(Tag.name, Tag.id).where(Tag.name.in_(all_names))).all())
+    db.session.execute(note_tags.insert(), [
+        {'note_id': note_id, 'tag_id': tag_ids[name]}
+        for note_id, names in names_by_note.items() for name in names
+    ])
+
+
+# Serialized notes keyed on (id, updated_at, tags, title, len(content)) so
+# lookups don't hash note bodies. Every edit bumps updated_at; title and
+# content length also catch most edits on backends that store DATETIME
+# at one-second precision (MySQL's default), where two edits in the same
+# second keep the same updated_at. A same-length content edit within that
+# second can still hit a stale entry there. Bounded by total bytes rather
+# than entry count.
+_JSON_CACHE_MAX_BYTES = 8 * 1024 * 1024
+_json_cache = OrderedDict()
+_json_cache_bytes = 0
+_json_cache_lock = threading.Lock()
+
+
+def _note_json(note_id, title, content, tags, created_at, updated_at):
+    """Serialized form of a note; unchanged notes hit the cache."""
+    global _json_cache_bytes
+    key = (note_id, updated_at, tags, title, len(content))
+    with _json_cache_lock:
+        data = _json_cache.get(key)
+        if data is not None:
+            _json_cache.move_to_end(key)
+            return data
+
+    data = orjson.dumps({
+        'id': note_id,
+        'title': title,
+        'content': content,
+        'tags': tags,
+        'created_at': created_at,
+        'updated_at': updated_at,
+    })
+    with _json_cache_lock:
+        if key not in _json_cache:
+            _json_cache[key] = data
+            _json_cache_bytes += len(data)
+            while _json_cache_bytes > _JSON_CACHE_MAX_BYTES:
+                _, evicted = _json_cache.popitem(last=False)
+                _json_cache_bytes -= len(evicted)
+    return data
+
+
 class Note(db.Model):
-    """Note model with tags stored as a comma-separated string."""
+    """Note model.
+
+    Tags are kept twice: as the comma-separated `tags` string, which is what
+    the API returns (in the order the client sent them), and as `note_tags`
+    links, which is what tag filtering queries.
+    """
     __tablename__ = 'notes'
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False)
     content = db.Column(db.Text, nullable=False)
-    # tags stored as a comma-separated string, e.g. "work,urgent"
+    # comma-separated tags, e.g. "work,urgent"; kept in sync with tags_rel
+    # by set_tags()
     tags = db.Column(db.String(255), nullable=False, default='')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        # every listing endpoint orders by most recently updated
+        db.Index('ix_notes_updated_at', updated_at.desc()),
+        # trigram expression index over SEARCH_TEXT lets Postgres answer
+        # LIKE '%q%' without a seq scan or a stored copy of the text
+        db.Index('ix_notes_search_trgm',
+                 func.lower(title + literal_column("' '") + content).label('search_text'),
+                 postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'},
+                 ).ddl_if(dialect='postgresql'),
+    )
+
+    tags_rel = db.relationship('Tag', secondary=note_tags)
+
     def __repr__(self):
         return f"<Note id={self.id} title={self.title!r}>"
 
+    def set_tags(self, names):
+        """Replace this note's tags with `names` (a list of tag strings).
+
+        Missing tags are inserted with ON CONFLICT DO NOTHING so concurrent
+        writers creating the same tag don't collide.
+        """
+        names = list(dict.fromkeys(names))
+        self.tags = ','.join(names)
+        # the tag queries below would otherwise flush this note first and
+        # then UPDATE it again for the tag changes
+        with db.session.no_autoflush:
+            if names:
+                insert_missing_tags(names)
+                existing = {t.name: t for t in Tag.query.filter(Tag.name.in_(names))}
+                self.tags_rel = [existing[n] for n in names]
+            else:
+                self.tags_rel = []
+
     def to_dict(self):
         return {
             'id': self.id,
             'title': self.title,
             'content': self.content,
             'tags': self.tags or '',
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            # raw datetimes: orjson formats them as ISO 8601 itself
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
         }
- 
 
+
+
+# Lowercased title + content; must match ix_notes_search_trgm's expression
+# exactly for Postgres to use the index.
+SEARCH_TEXT = func.lower(Note.title + literal_column("' '") + Note.content)
+
+# Columns for read-only listing queries that bypass the ORM entity.
+LIST_COLUMNS = (Note.id, Note.title, Note.content, Note.tags, Note.created_at, Note.updated_at)
+
+
+def rows_to_json(rows):
+    """Serialize note rows (mappings over LIST_COLUMNS) to JSON bytes."""
+    return [
+        _note_json(r['id'], r['title'], r['content'], r['tags'] or '',
+                   r['created_at'], r['updated_at'])
+        for r in rows
+    ]
+
+
+# SQLite: an external-content FTS5 index over title/content, kept in sync
+# by triggers. The trigram tokenizer gives case-insensitive substring
+# matching, i.e. the same semantics as the ILIKE search it replaces.
+_SQLITE_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5("
+    "title, content, content='notes', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS notes_fts_ai AFTER INSERT ON notes BEGIN "
+    "INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS notes_fts_ad AFTER DELETE ON notes BEGIN "
+    "INSERT INTO notes_fts(notes_fts, rowid, title, content) "
+    "VALUES ('delete', old.id, old.title, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS notes_fts_au AFTER UPDATE ON notes BEGIN "
+    "INSERT INTO notes_fts(notes_fts, rowid, title, content) "
+    "VALUES ('delete', old.id, old.title, old.content); "
+    "INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+)
+
+
+def upgrade_schema():
+    """Bring an existing database up to date where db.create_all() can't.
+
+    create_all() only creates missing tables, so a database whose `notes`
+    table predates these changes never gets the search indexes, nor tag
+    links for its notes. Runs on every startup, after create_all().
+
+    The indexes only speed things up, so failing to build them (e.g. the
+    database role may not create the pg_trgm extension, or another worker
+    is running the same DDL) is logged and the app starts anyway; search
+    then falls back to an unindexed LIKE scan.
+    """
+    if db.engine.dialect.name == 'sqlite':
+        # search queries notes_fts directly, so this part is required
+        with db.engine.begin() as conn:
+            had_fts = inspect(conn).has_table('notes_fts')
+            for stmt in _SQLITE_FTS_DDL:
+                conn.execute(text(stmt))
+            if not had_fts:
+                # index the rows that were written before the FTS table existed
+                conn.execute(text("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')"))
+    if db.engine.dialect.name == 'postgresql':
+        # the trigram operator classes live in the pg_trgm extension
+        _try_upgrade_step('create pg_trgm extension',
+                          lambda conn: conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm')))
+    for index in Note.__table__.indexes:
+        _try_upgrade_step(f'create index {index.name}',
+                          lambda conn, index=index: index.create(conn, checkfirst=True))
+    try:
+        _backfill_tag_links()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.warning('upgrade_schema: tag backfill skipped: %s', e)
+
+
+def _try_upgrade_step(what, step):
+    """Run one optional DDL step in its own transaction, logging failures."""
+    try:
+        with db.engine.begin() as conn:
+            step(conn)
+    except SQLAlchemyError as e:
+        current_app.logger.warning('upgrade_schema: could not %s: %s', what, e)
+
+
+def _backfill_tag_links():
+    """Link notes that only have the comma-separated `tags` string."""
+    rows = db.session.execute(
+        select(Note.id, Note.tags).where(Note.tags != '', ~Note.tags_rel.any())
+    ).all()
+    if not rows:
+        return
+    link_tags({
+        note_id: list(dict.fromkeys(filter(None, map(str.strip, tags.split(',')))))
+        for note_id, tags in rows
+    })
+    db.session.commit()
@@ -1,6 +1,6 @@
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
 from src.models import db
+from src.passwords import hash_password, verify_password
 
 
 class User(db.Model):
@@ -16,10 +16,10 @@ class User(db.Model):
         return f"<User id={self.id} username={self.username!r}>"
 
     def set_password(self, password: str):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password: str) -> bool:
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
 
     def to_dict(self):
         return {
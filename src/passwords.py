@@ -0,0 +1,62 @@
+import threading
+import time
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from werkzeug.security import check_password_hash
+
+_hasher = PasswordHasher()
+
+# Average verification time per hash scheme. Every verification is padded
+# up to the slowest average, so response time doesn't tell an argon2
+# account from a legacy pbkdf2 one, or either from an unknown user.
+_verify_times = {'argon2': 0.0, 'pbkdf2': 0.0}
+_verify_times_lock = threading.Lock()
+
+
+def _argon2_verify(password_hash, password):
+    try:
+        return _hasher.verify(password_hash, password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+
+def _padded(scheme, verify, password_hash, password):
+    started = time.perf_counter()
+    result = verify(password_hash, password)
+    elapsed = time.perf_counter() - started
+    with _verify_times_lock:
+        average = _verify_times[scheme]
+        _verify_times[scheme] = elapsed if not average else 0.9 * average + 0.1 * elapsed
+        floor = max(_verify_times.values())
+    if elapsed < floor:
+        time.sleep(floor - elapsed)
+    return result
+
+
+def hash_password(password: str) -> str:
+    """Hash `password` with argon2id.
+
+    argon2-cffi releases the GIL while hashing, so other request threads
+    keep running in the meantime.
+    """
+    return _hasher.hash(password)
+
+
+def verify_password(password_hash: str, password: str) -> bool:
+    """Check `password` against an argon2 or legacy werkzeug (pbkdf2) hash."""
+    if password_hash.startswith('$argon2'):
+        return _padded('argon2', _argon2_verify, password_hash, password)
+    return _padded('pbkdf2', check_password_hash, password_hash, password)
+
+
+# Built at import so the first unknown-user login doesn't also pay for hashing.
+_DUMMY_HASH = hash_password('not-a-real-password')
+
+
+def burn_verify(password: str) -> None:
+    """Spend the same time as a real check when there is no user to check.
+
+    Keeps "unknown user" and "wrong password" indistinguishable by
+    response time.
+    """
+    verify_password(_DUMMY_HASH, password)
@@ -1,20 +1,60 @@
+import hmac
+from functools import lru_cache
+
 from flask import Blueprint, request, jsonify
-from werkzeug.security import check_password_hash
+from sqlalchemy import case, or_
+from src.passwords import burn_verify, hash_password, verify_password
 
 auth_bp = Blueprint('auth', __name__)
 
 
+def _verify_method(user, password):
+    return user.check_password(password)
+
+
+def _verify_hash(user, password):
+    return verify_password(str(user.password_hash or ''), password)
+
+
+def _verify_plain(user, password):
+    # insecure, but at least avoid leaking length/prefix through an early-exit ==
+    # compare bytes: compare_digest rejects non-ASCII str
+    return hmac.compare_digest(str(user.password or '').encode('utf-8'), password.encode('utf-8'))
+
+
+@lru_cache(maxsize=None)
+def _login_strategy():
+    """Introspect the User model once: (User, login columns, verifier).
+
+    Done lazily on first use (not at import) so the app can still run if
+    the User model isn't present yet; an ImportError is not cached.
+    """
+    from src.models.user import User
+
+    login_cols = tuple(getattr(User, c) for c in ('username', 'email') if hasattr(User, c))
+    if callable(getattr(User, 'check_password', None)):
+        verify = _verify_method
+    elif hasattr(User, 'password_hash'):
+        verify = _verify_hash
+    elif hasattr(User, 'password'):
+        verify = _verify_plain
+    else:
+        verify = None
+    return User, login_cols, verify
+
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     """Login route: accepts JSON {username, password} and authenticates.
 
     Behavior:
     - Expects JSON with 'username' and 'password'.
-    - Attempts to import User from src.models.user and db from src.models.
+    - Imports User from src.models.user on first use and picks the login
+      columns and password check once (see _login_strategy).
     - Supports the following password checks in order:
         1) If User has method `check_password`, call it with the raw password.
-        2) If User has attribute `password_hash`, use werkzeug.security.check_password_hash.
-        3) If User has attribute `password`, compare raw equality (not recommended).
+        2) If User has attribute `password_hash`, use src.passwords.verify_password.
+        3) If User has attribute `password`, compare in constant time (not recommended).
     - Returns 200 and basic user info on success, 400/401/500 on errors.
     """
     data = request.get_json(silent=True) or {}
@@ -23,40 +63,30 @@ def login():
 
     if not username or not password:
         return jsonify({'error': 'username and password are required'}), 400
+    if not isinstance(username, str) or not isinstance(password, str):
+        return jsonify({'error': 'username and password must be strings'}), 400
 
     try:
-        # Lazy import so app can still run if User model isn't present yet.
-        from src.models.user import User
-        from src.models import db
+        User, login_cols, verify = _login_strategy()
     except Exception as e:
         return jsonify({'error': 'User model not available', 'detail': str(e)}), 500
 
+    if verify is None:
+        return jsonify({'error': 'No password verifier available for User model'}), 500
+
     try:
-        # Attempt to find the user by username field (try common column names)
-        user = None
-        for field in ('username', 'email'):
-            try:
-                user = User.query.filter(getattr(User, field) == username).first()
-                if user:
-                    break
-            except Exception:
-                # If the attribute doesn't exist on the model, skip
-                user = None
+        # One query matching the login against username or email; if it
+        # matches one user's username and another's email, username wins
+        query = User.query.filter(or_(*[col == username for col in login_cols]))
+        if len(login_cols) > 1:
+            query = query.order_by(case((login_cols[0] == username, 0), else_=1))
+        user = query.first()
 
         if not user:
+            burn_verify(str(password))
             return jsonify({'error': 'Invalid credentials'}), 401
 
-        # 1) Prefer check_password method if model provides it
-        if hasattr(user, 'check_password') and callable(getattr(user, 'check_password')):
-            valid = user.check_password(password)
-        # 2) Fall back to password_hash attribute
-        elif hasattr(user, 'password_hash'):
-            valid = check_password_hash(getattr(user, 'password_hash'), password)
-        # 3) As last resort, compare raw password field (insecure)
-        elif hasattr(user, 'password'):
-            valid = (getattr(user, 'password') == password)
-        else:
-            return jsonify({'error': 'No password verifier available for User model'}), 500
+        valid = verify(user, password)
 
         if not valid:
             return jsonify({'error': 'Invalid credentials'}), 401
@@ -80,7 +110,7 @@ def register():
     """Register a new user. Expects JSON: {username, email, password}.
 
     - username (required), password (required), email (optional)
-    - hashes password using werkzeug.generate_password_hash via User.set_password
+    - hashes password with argon2id via User.set_password
     - returns 201 with user info on success
     """
     data = request.get_json(silent=True) or {}
@@ -90,6 +120,8 @@ def register():
 
     if not username or not password:
         return jsonify({'error': 'username and password are required'}), 400
+    if not isinstance(username, str) or not isinstance(password, str):
+        return jsonify({'error': 'username and password must be strings'}), 400
 
     try:
         from src.models.user import User
@@ -115,8 +147,7 @@ def register():
             user.set_password(password)
         else:
             # Fallback: set password_hash directly
-            from werkzeug.security import generate_password_hash
-            user.password_hash = generate_password_hash(password)
+            user.password_hash = hash_password(password)
 
         db.session.add(user)
         db.session.commit()
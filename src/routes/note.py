@@ -1,38 +1,256 @@
-from flask import Blueprint, jsonify, request
-from src.models.note import Note, db
-from sqlalchemy import or_
+import base64
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Union
+
+import msgspec
+import orjson
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from src import cache
+from src.models.note import LIST_COLUMNS, SEARCH_TEXT, Note, Tag, db, link_tags, rows_to_json
+from sqlalchemy import bindparam, func, insert, select, text, tuple_
 
 note_bp = Blueprint('note', __name__)
 
+
+# one regex pass splits on commas and eats the whitespace around them
+_TAG_SPLIT = re.compile(r'\s*,\s*')
+
+
+@lru_cache(maxsize=1024)
+def _split_tag_string(tags):
+    return tuple(dict.fromkeys(filter(None, _TAG_SPLIT.split(tags.strip()))))
+
+
+def normalize_tags(tags):
+    """Normalize string-or-list tags into a deduplicated list of names.
+
+    Comma-separated strings are split through an LRU cache, since the same
+    tag strings tend to be sent over and over.
+    """
+    if isinstance(tags, str):
+        return list(_split_tag_string(tags))
+    return list(dict.fromkeys(filter(None, map(str.strip, tags))))
+
+
+class NoteIn(msgspec.Struct):
+    """Request body for creating a note.
+
+    `tags` is accepted as a comma-separated string or a list of strings;
+    after decoding it is always a normalized list of names.
+    """
+    title: str
+    content: str
+    tags: Union[str, list[str]] = ''
+
+    def __post_init__(self):
+        self.tags = normalize_tags(self.tags)
+
+
+class NoteUpdate(msgspec.Struct):
+    """Request body for updating a note; omitted fields are left as-is."""
+    title: Union[str, msgspec.UnsetType] = msgspec.UNSET
+    content: Union[str, msgspec.UnsetType] = msgspec.UNSET
+    tags: Union[str, list[str], msgspec.UnsetType] = msgspec.UNSET
+
+    def __post_init__(self):
+        if self.tags is not msgspec.UNSET:
+            self.tags = normalize_tags(self.tags)
+
+
+@note_bp.errorhandler(msgspec.DecodeError)
+def handle_bad_body(e):
+    # covers malformed JSON and msgspec.ValidationError (wrong/missing fields)
+    return jsonify({'error': str(e)}), 400
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_BATCH_SIZE = 1000
+
+
+def _page_args():
+    """Read `limit` and `cursor` query params.
+
+    Returns (limit, cursor) where cursor is None or an (updated_at, id)
+    tuple taken from a previous page's `next`. Raises ValueError on bad input.
+    """
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('limit must be an integer') from None
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    cursor = request.args.get('cursor')
+    if not cursor:
+        return limit, None
+    try:
+        updated_at, note_id = orjson.loads(base64.urlsafe_b64decode(cursor))
+        return limit, (datetime.fromisoformat(updated_at), int(note_id))
+    except Exception:
+        raise ValueError('invalid cursor') from None
+
+
+def _page_response(rows, limit):
+    """Wrap one page of note rows as {"items": [...], "next": cursor-or-null}.
+
+    `rows` is expected to hold up to limit + 1 rows; the extra row only
+    signals that another page exists.
+    """
+    rows = list(rows)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = base64.urlsafe_b64encode(
+            orjson.dumps([last['updated_at'], last['id']])).decode()
+    body = (b'{"items":[' + b','.join(rows_to_json(rows))
+            + b'],"next":' + orjson.dumps(next_cursor) + b'}')
+    return Response(body, mimetype='application/json')
+
+
+# Listing statements are built once per shape and reused with bound
+# parameters, so SQLAlchemy's compiled-statement cache always hits.
+
+def _page(stmt, with_cursor):
+    """Add keyset pagination (:upd, :id, :limit) to a select over LIST_COLUMNS."""
+    if with_cursor:
+        stmt = stmt.where(tuple_(Note.updated_at, Note.id)
+                          < tuple_(bindparam('upd', type_=db.DateTime), bindparam('id')))
+    return stmt.order_by(Note.updated_at.desc(), Note.id.desc()).limit(bindparam('limit'))
+
+
+@lru_cache(maxsize=None)
+def _fts_search_stmt(with_cursor):
+    cols = Note.__table__.c
+    sql = ("SELECT n.id, n.title, n.content, n.tags, n.created_at, n.updated_at "
+           "FROM notes n JOIN notes_fts f ON f.rowid = n.id WHERE notes_fts MATCH :q ")
+    if with_cursor:
+        sql += "AND (n.updated_at, n.id) < (:upd, :id) "
+    sql += "ORDER BY n.updated_at DESC, n.id DESC LIMIT :limit"
+    stmt = text(sql)
+    if with_cursor:
+        stmt = stmt.bindparams(bindparam('upd', type_=db.DateTime))
+    return stmt.columns(cols.id, cols.title, cols.content, cols.tags,
+                        cols.created_at, cols.updated_at)
+
+
+@lru_cache(maxsize=None)
+def _like_search_stmt(with_cursor):
+    return _page(select(*LIST_COLUMNS).where(
+        SEARCH_TEXT.like(func.lower(bindparam('pattern')))
+    ), with_cursor)
+
+
+@lru_cache(maxsize=None)
+def _tag_filter_stmt(with_cursor):
+    return _page(select(*LIST_COLUMNS).where(
+        Note.tags_rel.any(func.lower(Tag.name).in_(bindparam('wanted', expanding=True)))
+    ), with_cursor)
+
+
+def _page_params(limit, cursor, **params):
+    params['limit'] = limit + 1
+    if cursor:
+        params['upd'], params['id'] = cursor
+    return params
+
+
 @note_bp.route('/notes', methods=['GET'])
 def get_notes():
-    """Get all notes, ordered by most recently updated"""
-    notes = Note.query.order_by(Note.updated_at.desc()).all()
-    return jsonify([note.to_dict() for note in notes])
+    """Get all notes, ordered by most recently updated.
+
+    The JSON array is streamed in batches of plain rows (no ORM objects) so
+    the full result set is never held in memory and the first bytes go out
+    before the scan finishes.
+
+    When Redis is configured, the payload is also cached until the next
+    committed change to notes. On a cache miss, the streamed chunks are
+    buffered so they can be stored, up to cache.NOTES_LIST_MAX_BYTES. A
+    larger list is streamed without being cached.
+    """
+    cache_key = cache.notes_list_key()
+    if cache_key is not None:
+        cached = cache.fetch(cache_key)
+        if cached is not None:
+            return Response(cached, mimetype='application/json')
+
+    result = db.session.execute(
+        select(*LIST_COLUMNS).order_by(Note.updated_at.desc()),
+        execution_options={'stream_results': True, 'yield_per': 500},
+    ).mappings()
+
+    def generate():
+        # only hold on to the streamed chunks if there is a cache to fill
+        chunks = [] if cache_key is not None else None
+        size = 0
+        sep = b'['
+        for batch in result.partitions():
+            for row in rows_to_json(batch):
+                chunk = sep + row
+                if chunks is not None:
+                    size += len(chunk)
+                    if size > cache.NOTES_LIST_MAX_BYTES:
+                        chunks = None
+                    else:
+                        chunks.append(chunk)
+                yield chunk
+                sep = b','
+        tail = b']' if sep == b',' else b'[]'
+        yield tail
+        if chunks is not None:
+            chunks.append(tail)
+            cache.store(cache_key, b''.join(chunks), cache.NOTES_LIST_TTL)
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
 
 @note_bp.route('/notes', methods=['POST'])
 def create_note():
     """Create a new note"""
+    data = msgspec.json.decode(request.get_data(), type=NoteIn)
     try:
-        data = request.json
-        if not data or 'title' not in data or 'content' not in data:
-            return jsonify({'error': 'Title and content are required'}), 400
-        # Accept tags as either a comma-separated string or a list of strings.
-        tags = data.get('tags', '')
-        if isinstance(tags, list):
-            # join list into comma-separated string
-            tags = ','.join([str(t).strip() for t in tags if t is not None])
-        else:
-            tags = str(tags).strip()
-
-        note = Note(title=data['title'], content=data['content'], tags=tags)
+        note = Note(title=data.title, content=data.content)
         db.session.add(note)
+        note.set_tags(data.tags)
         db.session.commit()
         return jsonify(note.to_dict()), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@note_bp.route('/notes/batch', methods=['POST'])
+def create_notes_batch():
+    """Create many notes in one transaction.
+
+    Expects a JSON array of notes shaped like POST /notes bodies (at most
+    MAX_BATCH_SIZE). Rows go in as one multi-row INSERT ... RETURNING with a
+    single commit instead of an ORM object and flush per note.
+    """
+    data = msgspec.json.decode(request.get_data(), type=list[NoteIn])
+    if not data:
+        return jsonify({'error': 'No notes provided'}), 400
+    if len(data) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'At most {MAX_BATCH_SIZE} notes per batch'}), 400
+    try:
+        now = datetime.utcnow()
+        rows = db.session.execute(
+            insert(Note).returning(*LIST_COLUMNS, sort_by_parameter_order=True),
+            [{'title': n.title, 'content': n.content, 'tags': ','.join(n.tags),
+              'created_at': now, 'updated_at': now}
+             for n in data],
+        ).mappings().all()
+        link_tags({row['id']: n.tags for row, n in zip(rows, data)})
+        cache.mark_notes_changed(db.session)
+        body = b'[' + b','.join(rows_to_json(rows)) + b']'
+        db.session.commit()
+        return Response(body, status=201, mimetype='application/json')
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @note_bp.route('/notes/<int:note_id>', methods=['GET'])
 def get_note(note_id):
     """Get a specific note by ID"""
@@ -42,23 +260,18 @@ def get_note(note_id):
 @note_bp.route('/notes/<int:note_id>', methods=['PUT'])
 def update_note(note_id):
     """Update a specific note"""
+    note = Note.query.get_or_404(note_id)
+    data = msgspec.json.decode(request.get_data(), type=NoteUpdate)
+    if data.title is msgspec.UNSET and data.content is msgspec.UNSET and data.tags is msgspec.UNSET:
+        return jsonify({'error': 'No data provided'}), 400
     try:
-        note = Note.query.get_or_404(note_id)
-        data = request.json
-        
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
         # Update allowed fields; preserve existing values if not provided.
-        note.title = data.get('title', note.title)
-        note.content = data.get('content', note.content)
-
-        if 'tags' in data:
-            tags = data.get('tags')
-            if isinstance(tags, list):
-                tags = ','.join([str(t).strip() for t in tags if t is not None])
-            else:
-                tags = str(tags).strip()
-            note.tags = tags
+        if data.title is not msgspec.UNSET:
+            note.title = data.title
+        if data.content is not msgspec.UNSET:
+            note.content = data.content
+        if data.tags is not msgspec.UNSET:
+            note.set_tags(data.tags)
         db.session.commit()
         return jsonify(note.to_dict())
     except Exception as e:
@@ -79,21 +292,36 @@ def delete_note(note_id):
 
 @note_bp.route('/notes/search', methods=['GET'])
 def search_notes():
-    """Search notes by title or content"""
+    """Search notes by title or content.
+
+    Results are paginated newest first: pass `limit` (default 50, max 500)
+    and the `next` cursor from the previous page as `cursor`.
+    """
+    try:
+        limit, cursor = _page_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     # Support fuzzy, case-insensitive substring search on title or content.
-    # Trim whitespace and return empty list for blank queries to avoid
+    # Trim whitespace and return an empty page for blank queries to avoid
     # returning all notes accidentally.
     query = (request.args.get('q') or '').strip()
     if not query:
-        return jsonify([])
+        return _page_response([], limit)
 
-    pattern = f"%{query}%"
-    # Use ilike for case-insensitive matching (works on most DB backends).
-    notes = Note.query.filter(
-        (Note.title.ilike(pattern)) | (Note.content.ilike(pattern))
-    ).order_by(Note.updated_at.desc()).all()
+    # On SQLite, use the FTS5 trigram index (see models/note.py). Trigrams
+    # need at least 3 characters, so shorter queries fall through to LIKE.
+    if db.engine.dialect.name == 'sqlite' and len(query) >= 3:
+        phrase = '"' + query.replace('"', '""') + '"'
+        stmt = _fts_search_stmt(cursor is not None)
+        params = _page_params(limit, cursor, q=phrase)
+    else:
+        # Case-insensitive substring match on lower(title || ' ' || content)
+        # (on Postgres, served by the pg_trgm GIN expression index).
+        stmt = _like_search_stmt(cursor is not None)
+        params = _page_params(limit, cursor, pattern=f"%{query}%")
 
-    return jsonify([note.to_dict() for note in notes])
+    return _page_response(db.session.execute(stmt, params).mappings(), limit)
 
 
 @note_bp.route('/notes/tags', methods=['GET'])
@@ -104,30 +332,25 @@ def filter_notes_by_tags():
       - tags=query1,query2  (comma-separated string)
       - tag=value repeated, e.g. ?tag=one&tag=two
 
-    Matches notes where the stored comma-separated tags contain any of
-    the requested tags (case-insensitive substring match).
+    Matches notes carrying any of the requested tags (case-insensitive,
+    whole-tag match). Paginated like search_notes via `limit`/`cursor`.
     """
-    # Collect tags from repeated 'tag' params and from a single 'tags' param
-    requested = []
-    requested += [t.strip() for t in request.args.getlist('tag') if t and t.strip()]
-    tags_param = request.args.get('tags')
-    if tags_param:
-        requested += [t.strip() for t in tags_param.split(',') if t.strip()]
-
-    # Normalize and dedupe
-    tags = []
-    seen = set()
-    for t in requested:
-        if t and t.lower() not in seen:
-            seen.add(t.lower())
-            tags.append(t)
-
-    if not tags:
-        return jsonify([])
-
-    # Build OR filters: any note whose tags string contains one of the tags
-    patterns = [Note.tags.ilike(f"%{t}%") for t in tags]
-    notes = Note.query.filter(or_(*patterns)).order_by(Note.updated_at.desc()).all()
-
-    return jsonify([note.to_dict() for note in notes])
+    try:
+        limit, cursor = _page_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Collect tags from repeated 'tag' params and from a single 'tags'
+    # param into one string, lowercase it once and split it in a single
+    # regex pass (stored tag names never contain commas)
+    requested = ','.join([*request.args.getlist('tag'), request.args.get('tags', '')])
+    wanted = set(_split_tag_string(requested.lower()))
+
+    if not wanted:
+        return _page_response([], limit)
+
+    # Indexed lookup on lower(tags.name) through note_tags
+    stmt = _tag_filter_stmt(cursor is not None)
+    params = _page_params(limit, cursor, wanted=list(wanted))
 
+    return _page_response(db.session.execute(stmt, params).mappings(), limit)